@@ -1,8 +1,187 @@
 import os
+import base64
 import boto3
-import uuid
+import botocore.config
+from botocore.exceptions import ClientError
 import requests
-import json
+import threading
+import time
+from types import SimpleNamespace
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+from xml.sax.saxutils import escape as _xml_escape
+
+# orjson is much faster than the stdlib encoder; fall back if it isn't installed
+try:
+    import orjson
+
+    def _json_dumps(data):
+        return orjson.dumps(data)
+except ImportError:
+    import json
+
+    def _json_dumps(data):
+        return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+# Shared HTTP session, reused across warm invocations so the TLS connection
+# to Azure is pooled instead of re-established on every call. Plain HTTP/1.1
+# keep-alive is enough: each invocation makes a single request to Azure, so
+# there is nothing for HTTP/2 to multiplex.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=4,
+    max_retries=Retry(total=2,
+                      read=False,  # don't re-send after a read timeout, fail fast
+                      backoff_factor=0.2,
+                      status_forcelist=[429, 500, 502, 503, 504],
+                      # hand the last error response back instead of raising,
+                      # so Azure's error text still reaches the caller
+                      raise_on_status=False,
+                      allowed_methods=["HEAD", "POST"])
+))
+
+# Environment configuration, read and validated once per process
+_REQUIRED_ENV = ("AZURE_SPEECH_KEY", "AZURE_SPEECH_REGION", "SPACES_KEY",
+                 "SPACES_SECRET", "SPACES_REGION", "SPACES_BUCKET")
+
+_missing_env = [name for name in _REQUIRED_ENV if not os.environ.get(name)]
+if _missing_env:
+    raise RuntimeError(f"Missing environment variables: {', '.join(_missing_env)}")
+
+_CFG = SimpleNamespace(
+    speech_key=os.environ["AZURE_SPEECH_KEY"],
+    service_region=os.environ["AZURE_SPEECH_REGION"],
+    spaces_key=os.environ["SPACES_KEY"],
+    spaces_secret=os.environ["SPACES_SECRET"],
+    spaces_region=os.environ["SPACES_REGION"],
+    bucket=os.environ["SPACES_BUCKET"],
+    azure_url=f"https://{os.environ['AZURE_SPEECH_REGION']}.tts.speech.microsoft.com/cognitiveservices/v1"
+)
+
+# Optional background ping so the pooled Azure connection isn't dropped while
+# the container sits idle. Off by default since it keeps the container busy.
+_KEEPALIVE_INTERVAL = 55
+
+def _keepalive():
+    url = f"https://{_CFG.service_region}.tts.speech.microsoft.com/"
+    while True:
+        time.sleep(_KEEPALIVE_INTERVAL)
+        try:
+            _SESSION.head(url, timeout=2)
+        except requests.RequestException:
+            pass
+
+if os.getenv("ENABLE_KEEPALIVE") == "1":
+    threading.Thread(target=_keepalive, daemon=True).start()
+
+# Headers are the same on every call, so build them once (never mutate these)
+_AZURE_HEADERS = {
+    "Ocp-Apim-Subscription-Key": _CFG.speech_key,
+    "Content-Type": "application/ssml+xml",
+    "X-Microsoft-OutputFormat": "audio-16khz-64kbitrate-mono-mp3",
+    "User-Agent": "DO-Serverless",
+    "Connection": "keep-alive"
+}
+
+_RESPONSE_HEADERS = {
+    "Content-Type": "application/json"
+}
+
+# SSML request body, kept on one line so no stray whitespace goes over the wire
+_SSML_TMPL = ("<speak version='1.0' xml:lang='en-US'>"
+              "<voice xml:lang='en-US' xml:gender='Female' name='{v}'>{t}</voice>"
+              "</speak>")
+
+def _mk_key():
+    # 96 random bits, URL-safe base64 (16 chars) - shorter than a uuid4 string
+    return "daily_audio-" + base64.urlsafe_b64encode(os.urandom(12)).decode('ascii').rstrip('=') + ".mp3"
+
+# Spaces client, built on first use and cached for the life of the process
+_S3 = None
+
+def _get_s3():
+    global _S3
+    if _S3 is None:
+        _S3 = boto3.session.Session().client('s3',
+                                             region_name=_CFG.spaces_region,
+                                             endpoint_url=f'https://{_CFG.spaces_region}.digitaloceanspaces.com',
+                                             aws_access_key_id=_CFG.spaces_key,
+                                             aws_secret_access_key=_CFG.spaces_secret,
+                                             config=botocore.config.Config(
+                                                 max_pool_connections=8,
+                                                 retries={'max_attempts': 3, 'mode': 'adaptive'},
+                                                 # Over HTTPS, skip hashing the body for
+                                                 # SigV4 (UNSIGNED-PAYLOAD) and the extra
+                                                 # default CRC32 checksum
+                                                 signature_version='s3v4',
+                                                 s3={'payload_signing_enabled': False},
+                                                 request_checksum_calculation='when_required'))
+    return _S3
+
+# status.json is updated with an If-Match compare-and-swap so concurrent calls
+# can't clobber each other. The ETag (and version) from our last write is
+# remembered, so a warm container that is the only writer goes straight to the PUT.
+_STATUS_KEY = "status.json"
+_STATUS_ETAG = None
+_STATUS_VERSION = 0
+_STATUS_CAS_ATTEMPTS = 3
+
+# Returns the version status.json was written with. Versions are epoch
+# seconds; if the stored one is already at (or past) ours - two calls in the
+# same second - ours is bumped to stored + 1 so the newer write still wins.
+def _put_status(client, status_data):
+    global _STATUS_ETAG, _STATUS_VERSION
+
+    for _ in range(_STATUS_CAS_ATTEMPTS):
+        condition = {}
+        if _STATUS_ETAG is None:
+            # Look at what's there now (HEAD only - the version is kept in metadata)
+            try:
+                head = client.head_object(Bucket=_CFG.bucket, Key=_STATUS_KEY)
+            except ClientError as e:
+                if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                    raise
+                # Doesn't exist yet: only create it if nobody else just did
+                condition = {"IfNoneMatch": "*"}
+                _STATUS_VERSION = 0
+            else:
+                _STATUS_ETAG = head['ETag']
+                _STATUS_VERSION = int(head.get('Metadata', {}).get('version', 0))
+
+        if not condition:
+            condition = {"IfMatch": _STATUS_ETAG}
+
+        version = max(status_data["version"], _STATUS_VERSION + 1)
+        body = _json_dumps(dict(status_data, version=version))
+
+        try:
+            response = client.put_object(Bucket=_CFG.bucket,
+                                         Key=_STATUS_KEY,
+                                         Body=body,
+                                         ContentLength=len(body),
+                                         Metadata={'version': str(version)},
+                                         ACL='public-read',
+                                         ContentType='application/json',
+                                         CacheControl='no-cache, no-store, must-revalidate',
+                                         **condition)
+        except Exception as e:
+            # Whatever went wrong, don't trust the cached ETag/version next time
+            _STATUS_ETAG = None
+            _STATUS_VERSION = 0
+            code = e.response['Error']['Code'] if isinstance(e, ClientError) else None
+            # Someone else wrote (or deleted status.json) in between; refresh
+            # and try again - a missing object gets recreated via IfNoneMatch
+            if code not in ('PreconditionFailed', 'ConditionalRequestConflict', '404', 'NoSuchKey'):
+                raise
+            continue
+
+        _STATUS_ETAG = response['ETag']
+        _STATUS_VERSION = version
+        return version
+
+    raise RuntimeError(f"Could not update {_STATUS_KEY}: too many concurrent writers")
 
 def main(args):
     # 1. Extract Input
@@ -14,92 +193,64 @@ def main(args):
     alert_start = args.get("alertStart", None)
     alert_end = args.get("alertEnd", None)
     
-    # 2. Define headers
-    response_headers = {
-        "Content-Type": "application/json"
-    }
-
     try:
-        # Get Environment Variables
-        speech_key = os.getenv("AZURE_SPEECH_KEY")
-        service_region = os.getenv("AZURE_SPEECH_REGION")
-        spaces_key = os.getenv("SPACES_KEY")
-        spaces_secret = os.getenv("SPACES_SECRET")
-        spaces_region = os.getenv("SPACES_REGION")
-        bucket_name = os.getenv("SPACES_BUCKET")
-
-        # 3. Call Azure Speech via REST API
-        azure_url = f"https://{service_region}.tts.speech.microsoft.com/cognitiveservices/v1"
-        
-        azure_headers = {
-            "Ocp-Apim-Subscription-Key": speech_key,
-            "Content-Type": "application/ssml+xml",
-            "X-Microsoft-OutputFormat": "audio-16khz-64kbitrate-mono-mp3",
-            "User-Agent": "DO-Serverless"
-        }
+        # 2. Call Azure Speech via REST API
+        # Escape user input so &, < and quotes can't break (or inject into) the SSML
+        ssml_body = _SSML_TMPL.format(
+            v=_xml_escape(selected_voice, {'"': "&quot;", "'": "&apos;"}),
+            t=_xml_escape(text)
+        ).encode('utf-8')
 
-        ssml_body = f"""
-        <speak version='1.0' xml:lang='en-US'>
-            <voice xml:lang='en-US' xml:gender='Female' name='{selected_voice}'>
-                {text}
-            </voice>
-        </speak>
-        """
-
-        response = requests.post(azure_url, headers=azure_headers, data=ssml_body)
+        try:
+            # Not streamed, so the whole audio body is read inside this try too
+            response = _SESSION.post(_CFG.azure_url, headers=_AZURE_HEADERS, data=ssml_body, timeout=(3.05, 30))
+        except (requests.Timeout, requests.ConnectionError) as e:
+            # A read timeout while downloading the body surfaces as a
+            # ConnectionError wrapping urllib3's ReadTimeoutError
+            if not isinstance(e, requests.Timeout) and not (e.args and isinstance(e.args[0], ReadTimeoutError)):
+                raise
+            return {
+                "body": {"error": "Azure Error: request timed out"},
+                "headers": _RESPONSE_HEADERS,
+                "statusCode": 504
+            }
         
         if response.status_code != 200:
             return {
                 "body": {"error": f"Azure Error: {response.text}"},
-                "headers": response_headers,
+                "headers": _RESPONSE_HEADERS,
                 "statusCode": 400
             }
 
+        # Buffered (the MP3 is a few hundred KB): botocore needs a seekable
+        # body to retry a failed PUT, and .content is already decoded so its
+        # length is the real upload size
         audio_data = response.content
+        content_length = len(audio_data)
 
-        # 4. Setup Boto3 Client
-        session = boto3.session.Session()
-        client = session.client('s3',
-                                region_name=spaces_region,
-                                endpoint_url=f'https://{spaces_region}.digitaloceanspaces.com',
-                                aws_access_key_id=spaces_key,
-                                aws_secret_access_key=spaces_secret)
+        # 3. Get (cached) Boto3 Client
+        client = _get_s3()
 
         # Generate Unique Filename
-        filename = f"daily_audio-{uuid.uuid4()}.mp3"
+        filename = _mk_key()
         
+        file_url = f"https://{_CFG.bucket}.{_CFG.spaces_region}.digitaloceanspaces.com/{filename}"
+
         # Upload Audio
-        client.put_object(Bucket=bucket_name, 
-                          Key=filename, 
-                          Body=audio_data, 
-                          ACL='public-read', 
+        client.put_object(Bucket=_CFG.bucket,
+                          Key=filename,
+                          Body=audio_data,
+                          ContentLength=content_length,
+                          ACL='public-read',
                           ContentType='audio/mpeg')
 
-        file_url = f"https://{bucket_name}.{spaces_region}.digitaloceanspaces.com/{filename}"
-
         # ---------------------------------------------------------
         # UPDATE STATUS.JSON (SIMPLE VERSION)
         # ---------------------------------------------------------
-        status_filename = "status.json"
-        
-        try:
-            # Download existing status.json to get the PREVIOUS version number
-            s3_response = client.get_object(Bucket=bucket_name, Key=status_filename)
-            file_content = s3_response['Body'].read().decode('utf-8')
-            old_data = json.loads(file_content)
-            
-            # Handle potential format mismatch
-            if "history" in old_data:
-                current_version = old_data["history"][-1]["version"]
-            else:
-                current_version = old_data.get("version", 0)
-
-        except Exception:
-            # If file doesn't exist, start at 0
-            current_version = 0
-
-        # Calculate New Data
-        new_version = current_version + 1
+        # The version is an epoch-seconds timestamp rather than a counter read
+        # back from status.json: it keeps increasing across invocations
+        # without a GET. Same-second ties are resolved in _put_status.
+        new_version = int(time.time())
         
         # NEW: Construct the JSON payload with timestamps included
         status_data = {
@@ -110,14 +261,9 @@ def main(args):
         }
 
         # Overwrite status.json with the single new object
-        client.put_object(Bucket=bucket_name, 
-                          Key=status_filename, 
-                          Body=json.dumps(status_data, indent=2), 
-                          ACL='public-read', 
-                          ContentType='application/json',
-                          CacheControl='no-cache, no-store, must-revalidate')
-
-        # 5. Return Success
+        new_version = _put_status(client, status_data)
+
+        # 4. Return Success
         return {
             "body": {
                 "url": file_url, 
@@ -125,13 +271,13 @@ def main(args):
                 "alertStart": alert_start,
                 "alertEnd": alert_end
             },
-            "headers": response_headers,
+            "headers": _RESPONSE_HEADERS,
             "statusCode": 200
         }
 
     except Exception as e:
         return {
             "body": {"error": str(e)},
-            "headers": response_headers,
+            "headers": _RESPONSE_HEADERS,
             "statusCode": 500
         }
@@ -0,0 +1,102 @@
+import importlib.util
+import os
+import pathlib
+
+import boto3
+import pytest
+from botocore.stub import ANY, Stubber
+
+for _name in ("AZURE_SPEECH_KEY", "AZURE_SPEECH_REGION", "SPACES_KEY",
+              "SPACES_SECRET", "SPACES_REGION", "SPACES_BUCKET"):
+    os.environ.setdefault(_name, "test")
+
+_PATH = pathlib.Path(__file__).parents[1] / "packages" / "speech" / "convert" / "__main__.py"
+_spec = importlib.util.spec_from_file_location("convert_main", _PATH)
+convert = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(convert)
+
+BUCKET = os.environ["SPACES_BUCKET"]
+
+
+@pytest.fixture
+def s3():
+    convert._STATUS_ETAG = None
+    convert._STATUS_VERSION = 0
+    client = boto3.client("s3", region_name="us-east-1",
+                          aws_access_key_id="key", aws_secret_access_key="secret")
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+def _put_params(version, **condition):
+    return {
+        "Bucket": BUCKET,
+        "Key": "status.json",
+        "Body": ANY,
+        "ContentLength": ANY,
+        "Metadata": {"version": str(version)},
+        "ACL": "public-read",
+        "ContentType": "application/json",
+        "CacheControl": "no-cache, no-store, must-revalidate",
+        **condition,
+    }
+
+
+def _head_params():
+    return {"Bucket": BUCKET, "Key": "status.json"}
+
+
+def test_cold_create(s3):
+    client, stubber = s3
+    stubber.add_client_error("head_object", "404", http_status_code=404,
+                             expected_params=_head_params())
+    stubber.add_response("put_object", {"ETag": '"e1"'},
+                         _put_params(1000, IfNoneMatch="*"))
+
+    assert convert._put_status(client, {"version": 1000}) == 1000
+    assert convert._STATUS_ETAG == '"e1"'
+    assert convert._STATUS_VERSION == 1000
+
+
+def test_warm_single_put(s3):
+    client, stubber = s3
+    convert._STATUS_ETAG = '"e1"'
+    convert._STATUS_VERSION = 1000
+    stubber.add_response("put_object", {"ETag": '"e2"'},
+                         _put_params(1005, IfMatch='"e1"'))
+
+    assert convert._put_status(client, {"version": 1005}) == 1005
+    assert convert._STATUS_ETAG == '"e2"'
+
+
+def test_same_second_conflict_bumps_version(s3):
+    client, stubber = s3
+    convert._STATUS_ETAG = '"e1"'
+    convert._STATUS_VERSION = 990
+    stubber.add_client_error("put_object", "PreconditionFailed", http_status_code=412,
+                             expected_params=_put_params(1000, IfMatch='"e1"'))
+    stubber.add_response("head_object", {"ETag": '"e2"', "Metadata": {"version": "1000"}},
+                         _head_params())
+    stubber.add_response("put_object", {"ETag": '"e3"'},
+                         _put_params(1001, IfMatch='"e2"'))
+
+    assert convert._put_status(client, {"version": 1000}) == 1001
+    assert convert._STATUS_ETAG == '"e3"'
+    assert convert._STATUS_VERSION == 1001
+
+
+def test_deleted_object_is_recreated(s3):
+    client, stubber = s3
+    convert._STATUS_ETAG = '"e1"'
+    convert._STATUS_VERSION = 2000
+    stubber.add_client_error("put_object", "NoSuchKey", http_status_code=404,
+                             expected_params=_put_params(2001, IfMatch='"e1"'))
+    stubber.add_client_error("head_object", "404", http_status_code=404,
+                             expected_params=_head_params())
+    stubber.add_response("put_object", {"ETag": '"e2"'},
+                         _put_params(1500, IfNoneMatch="*"))
+
+    assert convert._put_status(client, {"version": 1500}) == 1500
+    assert convert._STATUS_ETAG == '"e2"'
+    assert convert._STATUS_VERSION == 1500